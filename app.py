@@ -1,28 +1,169 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, field_validator, ValidationError
+from fastapi import FastAPI, HTTPException, Request
+from pydantic import BaseModel, PrivateAttr, field_validator, model_validator, ValidationError
 import httpx
+import asyncio
 import logging
-from urllib.parse import urlparse
+import re
 import base64
 import validators
 import html
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from dotenv import load_dotenv
+from cachetools import LRUCache, TTLCache
+from contextlib import asynccontextmanager
 import os
+import orjson
+import hashlib
+import diskcache
+import tiktoken
+import random
+import time
 
 load_dotenv()
 
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
+REVIEW_CACHE_DIR = os.getenv('REVIEW_CACHE_DIR', '/tmp/reviews')
+REVIEW_CACHE_TTL = 24 * 60 * 60
+MAX_CONCURRENT_REVIEWS = int(os.getenv('MAX_CONCURRENT_REVIEWS', '4'))
+MAX_CONCURRENT_BLOB_FETCHES = 8
+GITHUB_RAW_MEDIA_TYPE = 'application/vnd.github.v3.raw'
+ALLOWED_EXTENSIONS = ('.py', '.js', '.java', '.cpp', '.c', '.cs', '.rb', '.go', '.php', '.html', '.css', '.swift', '.kt')
+VALID_CANDIDATE_LEVELS = frozenset({'Junior', 'Middle', 'Senior'})
+# Matches https://github.com/<owner>/<repo> with an optional .git suffix and trailing path
+GITHUB_REPO_URL_RE = re.compile(r'^https?://github\.com/([^/?#]+)/([^/?#]+?)(?:\.git)?(?:[/?#].*)?$')
+
+MAX_PROMPT_TOKENS = 6000
+MAX_PROMPT_LENGTH = 20000
+TOKEN_ENCODING_RETRY_DELAY = 60
+
+SYSTEM_PROMPT = """You are a professional code developer. Your task is to provide a review of the candidate's project.
+
+The structure of the response should be as follows:
+
+1. **Drawbacks**:
+- Brief mentions of what is missing, not done, or not considered.
+
+2. **Evaluation**:
+- Final score on a 5-point scale, based on the number and severity of errors and shortcomings.
+- Remember that the score should consider the level the candidate is applying for:
+    - **Junior**: Some errors and shortcomings are acceptable, as the candidate is just starting their career. A score of 5/5 means the candidate has shown excellent knowledge and potential for their level.
+    - **Middle**: Confident mastery of basic technologies and practices is expected. A score of 5/5 means the candidate performs tasks above average.
+    - **Senior**: A high level of professionalism is expected; the code should be close to ideal, following best practices and without errors. A score of 5/5 means the code is executed at an exceptional level.
+
+3. **Improvement Tips**:
+- Brief tips on how to improve the code.
+
+4. **Conclusion**:
+- A short summary of the code and the project's outcome."""
+
+tree_cache = TTLCache(maxsize=256, ttl=900)
+# Bounded by total characters rather than entry count, so a few huge files cannot exhaust memory
+BLOB_CACHE_MAX_CHARS = 32 * 1024 * 1024
+blob_cache = LRUCache(maxsize=BLOB_CACHE_MAX_CHARS, getsizeof=len)
+etag_cache = LRUCache(maxsize=512)
+
+class GitHubRateLimited(Exception):
+    pass
+
+class RateLimitRetryTransport(httpx.AsyncBaseTransport):
+    # Retries GitHub rate-limit responses, honoring Retry-After and X-RateLimit-Reset when present
+    def __init__(self, transport, max_attempts=5, max_wait=60):
+        self.transport = transport
+        self.max_attempts = max_attempts
+        self.max_wait = max_wait
+
+    async def handle_async_request(self, request):
+        for attempt in range(1, self.max_attempts + 1):
+            response = await self.transport.handle_async_request(request)
+            if not is_rate_limited(response):
+                return response
+            delay = get_retry_delay(response, attempt)
+            await response.aclose()
+            if attempt == self.max_attempts or delay > self.max_wait:
+                break
+            logger.warning(f'GitHub rate limit hit for {request.url}, retrying in {delay:.1f}s (attempt {attempt}/{self.max_attempts})')
+            await asyncio.sleep(delay)
+        raise GitHubRateLimited('GitHub API rate limit exceeded.')
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+def is_rate_limited(response):
+    if response.status_code == 429:
+        return True
+    # Secondary rate limits and exhausted quotas are reported as 403
+    return response.status_code == 403 and (
+        'retry-after' in response.headers or response.headers.get('x-ratelimit-remaining') == '0'
+    )
+
+def get_retry_delay(response, attempt):
+    retry_after = response.headers.get('retry-after')
+    if retry_after is not None and retry_after.isdigit():
+        return int(retry_after)
+    reset = response.headers.get('x-ratelimit-reset')
+    if response.headers.get('x-ratelimit-remaining') == '0' and reset is not None and reset.isdigit():
+        return max(int(reset) - time.time(), 0)
+    return min(2 ** (attempt - 1), 30) + random.uniform(0, 1)
+
+async def load_token_encoding(app):
+    # tiktoken downloads the encoding on first use, so it is loaded once in the background
+    # instead of inside a request; prompts are truncated by characters until it succeeds
+    while True:
+        try:
+            encoding = await asyncio.to_thread(tiktoken.get_encoding, 'cl100k_base')
+        except Exception as e:
+            logger.warning(f'Token encoding unavailable, retrying in {TOKEN_ENCODING_RETRY_DELAY}s: {str(e)}')
+            await asyncio.sleep(TOKEN_ENCODING_RETRY_DELAY)
+            continue
+        # The system prompt is sent with every review, so its tokens come out of the shared budget
+        app.state.prompt_token_budget = MAX_PROMPT_TOKENS - len(encoding.encode(SYSTEM_PROMPT))
+        app.state.token_encoding = encoding
+        return
+
+@asynccontextmanager
+async def lifespan(app):
+    # Shared clients keep connections alive across requests instead of paying a new TLS handshake per call
+    limits = httpx.Limits(max_keepalive_connections=20, max_connections=100)
+    gh_headers = {'Accept': 'application/vnd.github+json'}
+    if GITHUB_TOKEN:
+        gh_headers['Authorization'] = f'token {GITHUB_TOKEN}'
+    app.state.gh_client = httpx.AsyncClient(
+        base_url='https://api.github.com',
+        headers=gh_headers,
+        transport=RateLimitRetryTransport(httpx.AsyncHTTPTransport(http2=True, limits=limits))
+    )
+    app.state.mistral_client = httpx.AsyncClient(
+        base_url='https://api.mistral.ai/v1',
+        http2=True,
+        limits=limits,
+        timeout=httpx.Timeout(30.0)
+    )
+    app.state.review_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REVIEWS)
+    # Reviews persist on disk so repeated prompts skip the Mistral call across restarts
+    app.state.review_cache = diskcache.Cache(REVIEW_CACHE_DIR)
+    app.state.token_encoding = None
+    app.state.prompt_token_budget = MAX_PROMPT_TOKENS
+    token_encoding_task = asyncio.create_task(load_token_encoding(app))
+    try:
+        yield
+    finally:
+        token_encoding_task.cancel()
+        await app.state.gh_client.aclose()
+        await app.state.mistral_client.aclose()
+        app.state.review_cache.close()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request, exc):
     # Extract all error messages
     error_messages = [err['msg'] for err in exc.errors()]
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=422,
         content={"errors": error_messages}
     )
@@ -31,100 +172,266 @@ class ReviewRequest(BaseModel):
     assignment_description: str
     github_url_repo: str
     candidate_level: str
+    _owner: str = PrivateAttr()
+    _repo_name: str = PrivateAttr()
 
     @field_validator('github_url_repo')
     def validate_github_url(cls, v):
         if not validators.url(v):
             raise ValueError('Invalid GitHub repository URL.')
-        parsed_url = urlparse(v)
-        if parsed_url.netloc != 'github.com':
-            raise ValueError('URL must be a GitHub repository.')
         return v
 
     @field_validator('candidate_level')
     def validate_candidate_level(cls, v):
-        valid_levels = ['Junior', 'Middle', 'Senior']
-        if v not in valid_levels:
+        if v not in VALID_CANDIDATE_LEVELS:
             raise ValueError('Invalid candidate level. Allowed values: Junior, Middle, Senior.')
         return v
 
-async def collect_code_from_github_repo(repo_url):
-    parsed_url = urlparse(repo_url)
-    if parsed_url.netloc != 'github.com':
-        raise ValueError('Invalid domain in GitHub repository URL.')
-
-    path_parts = parsed_url.path.strip('/').split('/')
-    if len(path_parts) < 2:
-        raise ValueError('Invalid path in GitHub repository URL.')
-
-    owner, repo_name = path_parts[0], path_parts[1]
-
-    repo_api_url = f'https://api.github.com/repos/{owner}/{repo_name}'
-
-    async with httpx.AsyncClient() as client:
-        response = await client.get(repo_api_url)
-        if response.status_code != 200:
-            logger.error(f'Error fetching repository data: {response.status_code}')
-            raise ValueError('Failed to access GitHub repository. Check the URL and access rights.')
-
-        repo_data = response.json()
-        default_branch = repo_data.get('default_branch', 'main')
-        tree_url = f'https://api.github.com/repos/{owner}/{repo_name}/git/trees/{default_branch}?recursive=1'
-
-        response = await client.get(tree_url)
-        if response.status_code != 200:
-            logger.error(f'Error fetching repository tree: {response.status_code}')
-            raise ValueError('Failed to retrieve GitHub repository content.')
-
-        tree_data = response.json()
-        tree = tree_data.get('tree', [])
-        code = ''
-        file_list = '\nAll repository files:\n'
-        max_code_length = 20000
-        allowed_extensions = ['.py', '.js', '.java', '.cpp', '.c', '.cs', '.rb', '.go', '.php', '.html', '.css', '.swift', '.kt']
-        file_count = 0
-        max_files = 100
-
-        for item in tree:
-            if file_count >= max_files or len(code) >= max_code_length:
+    @model_validator(mode='after')
+    def extract_repository(self):
+        # A single match both checks the repository URL and extracts owner and repository name
+        match = GITHUB_REPO_URL_RE.match(self.github_url_repo)
+        if not match:
+            raise ValueError('URL must be a GitHub repository.')
+        self._owner, self._repo_name = match.groups()
+        return self
+
+    @property
+    def owner(self):
+        return self._owner
+
+    @property
+    def repo_name(self):
+        return self._repo_name
+
+async def collect_code_from_github_repo(client, owner, repo_name):
+    tree = await get_repository_tree(client, owner, repo_name)
+    file_paths = []
+    max_code_length = 20000
+    max_files = 100
+
+    candidates = []
+    candidates_size = 0
+    for item in tree:
+        file_paths.append(item['path'])
+        if item['type'] == 'blob':
+            path = item['path']
+            if not path.endswith(ALLOWED_EXTENSIONS):
+                logger.debug('Skipping file with unsuitable extension: %s', path)
+                continue
+            # Tree entries carry blob sizes, so files past the code budget are never downloaded;
+            # an oversized file still fills the remaining budget and is truncated with the rest
+            if len(candidates) >= max_files or candidates_size >= max_code_length:
+                continue
+            candidates.append(item)
+            candidates_size += item.get('size', 0)
+
+    result = None
+    if GITHUB_TOKEN:
+        result = await fetch_files_graphql(client, owner, repo_name, candidates, max_code_length)
+    if result is None:
+        result = await fetch_files_rest(client, candidates, max_code_length)
+    files, failed_count = result
+
+    code = ''.join(files)
+    logger.info('Collected %d of %d candidate files (%d tree entries), %d characters', len(files), len(candidates), len(tree), len(code))
+    # Assemble the result in one join instead of growing a string piece by piece
+    code_parts = [code[:max_code_length]]
+    if len(code) > max_code_length:
+        code_parts.append('\n\n// Code truncated due to size limitations.')
+    code_parts.append('\nAll repository files:\n')
+    code_parts.extend(f'{path}\n' for path in file_paths)
+    # Callers need to know whether upstream errors left files out of the collected code
+    return ''.join(code_parts), failed_count == 0
+
+async def fetch_files_rest(client, candidates, max_code_length):
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_BLOB_FETCHES)
+
+    async def fetch(index, item):
+        async with semaphore:
+            return index, await fetch_file_content(client, item)
+
+    tasks = [asyncio.create_task(fetch(index, item)) for index, item in enumerate(candidates)]
+    results = {}
+    files = []
+    failed_count = 0
+    code_length = 0
+    next_index = 0
+    try:
+        # Downloads finish in any order, but the budget is applied to the tree-order prefix so
+        # identical requests always build the same prompt; the rest is cancelled once it is full
+        for next_file in asyncio.as_completed(tasks):
+            index, file_content = await next_file
+            results[index] = file_content
+            while next_index in results and code_length < max_code_length:
+                file_content = results.pop(next_index)
+                if file_content is None:
+                    failed_count += 1
+                else:
+                    chunk = f"\n\n// File: {candidates[next_index]['path']}\n{file_content}"
+                    files.append(chunk)
+                    code_length += len(chunk)
+                next_index += 1
+            if code_length >= max_code_length:
                 break
-            file_list += f"{item['path']}\n"
-            if item['type'] == 'blob':
-                path = item['path']
-                if not any(path.endswith(ext) for ext in allowed_extensions):
-                    logger.info(f'Skipping file with unsuitable extension: {path}')
-                    continue
-                logger.info(f'Processing file: {path}')
-                blob_url = item['url']
-                try:
-                    blob_response = await client.get(blob_url)
-                    if blob_response.status_code == 200:
-                        blob_data = blob_response.json()
-                        content = blob_data.get('content', '')
-                        encoding = blob_data.get('encoding', '')
-                        if encoding == 'base64':
-                            try:
-                                file_content = base64.b64decode(content).decode('utf-8')
-                            except UnicodeDecodeError:
-                                logger.warning(f'File {path} cannot be decoded in UTF-8, skipping.')
-                                continue
-                            code += f'\n\n// File: {path}\n{file_content}'
-                            file_count += 1
-                            if len(code) > max_code_length:
-                                code = code[:max_code_length]
-                                code += '\n\n// Code truncated due to size limitations.'
-                                break
-                        else:
-                            logger.warning(f'Unknown encoding format for file {path}')
-                    else:
-                        logger.error(f'Error fetching file {path}: {blob_response.status_code}')
-                except Exception as e:
-                    logger.error(f'Error reading file {path}: {str(e)}')
-        code += file_list
-        return code
-
-def get_mistral_review(prompt):
-    api_url = 'https://api.mistral.ai/v1/chat/completions'
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return files, failed_count
+
+async def fetch_files_graphql(client, owner, repo_name, candidates, max_code_length):
+    # One GraphQL query returns the text of every uncached blob, replacing a REST call per file
+    contents = {item['sha']: blob_cache[item['sha']] for item in candidates if item.get('sha') in blob_cache}
+    missing = [item for item in candidates if item.get('sha') not in contents]
+    failed_count = 0
+    if missing:
+        variables = {'owner': owner, 'name': repo_name}
+        declarations = ['$owner: String!', '$name: String!']
+        fields = []
+        for index, item in enumerate(missing):
+            variables[f'oid{index}'] = item['sha']
+            declarations.append(f'$oid{index}: GitObjectID!')
+            fields.append(f'f{index}: object(oid: $oid{index}) {{ ... on Blob {{ text isBinary }} }}')
+        query = f"query({', '.join(declarations)}) {{ repository(owner: $owner, name: $name) {{ {' '.join(fields)} }} }}"
+        try:
+            response = await client.post('/graphql', content=orjson.dumps({'query': query, 'variables': variables}))
+            response_json = orjson.loads(response.content) if response.status_code == 200 else {}
+        except GitHubRateLimited:
+            raise
+        except Exception as e:
+            logger.warning(f'Error querying GitHub GraphQL API: {str(e)}')
+            return None
+        repository = (response_json.get('data') or {}).get('repository')
+        if response_json.get('errors') or not repository:
+            logger.warning(f'GitHub GraphQL API unavailable ({response.status_code}), falling back to REST.')
+            return None
+        for index, item in enumerate(missing):
+            blob = repository.get(f'f{index}') or {}
+            if blob.get('isBinary'):
+                logger.warning(f"File {item['path']} is binary, skipping.")
+                continue
+            if blob.get('text') is None:
+                logger.error(f"Error fetching file {item['path']}: no text returned by GitHub GraphQL API")
+                failed_count += 1
+                continue
+            contents[item['sha']] = blob['text']
+            cache_blob(item['sha'], blob['text'])
+
+    files = []
+    code_length = 0
+    for item in candidates:
+        file_content = contents.get(item.get('sha'))
+        if file_content is None:
+            continue
+        chunk = f"\n\n// File: {item['path']}\n{file_content}"
+        files.append(chunk)
+        code_length += len(chunk)
+        if code_length >= max_code_length:
+            break
+    return files, failed_count
+
+async def conditional_get(client, url, headers=None):
+    # GitHub answers If-None-Match with a bodiless 304 that does not count against the rate limit
+    request_headers = dict(headers or {})
+    cached = etag_cache.get(url)
+    if cached is not None:
+        request_headers['If-None-Match'] = cached[0]
+    response = await client.get(url, headers=request_headers)
+    if response.status_code == 304 and cached is not None:
+        return httpx.Response(200, content=cached[1], request=response.request)
+    etag = response.headers.get('etag')
+    if response.status_code == 200 and etag:
+        etag_cache[url] = (etag, response.content)
+    return response
+
+async def get_repository_tree(client, owner, repo_name):
+    repo_api_url = f'/repos/{owner}/{repo_name}'
+
+    response = await conditional_get(client, repo_api_url)
+    if response.status_code != 200:
+        logger.error(f'Error fetching repository data: {response.status_code}')
+        raise ValueError('Failed to access GitHub repository. Check the URL and access rights.')
+
+    repo_data = orjson.loads(response.content)
+    default_branch = repo_data.get('default_branch', 'main')
+
+    # Resolve the branch head so cached trees are never served for a newer commit
+    response = await conditional_get(
+        client,
+        f'/repos/{owner}/{repo_name}/commits/{default_branch}',
+        headers={'Accept': 'application/vnd.github.sha'}
+    )
+    if response.status_code != 200:
+        logger.error(f'Error fetching branch head: {response.status_code}')
+        raise ValueError('Failed to retrieve GitHub repository content.')
+
+    commit_sha = response.text.strip()
+    cache_key = (owner, repo_name, commit_sha)
+    tree = tree_cache.get(cache_key)
+    if tree is not None:
+        logger.info(f'Using cached tree for {owner}/{repo_name}@{commit_sha}')
+        return tree
+
+    tree_url = f'/repos/{owner}/{repo_name}/git/trees/{commit_sha}?recursive=1'
+
+    response = await client.get(tree_url)
+    if response.status_code != 200:
+        logger.error(f'Error fetching repository tree: {response.status_code}')
+        raise ValueError('Failed to retrieve GitHub repository content.')
+
+    tree_data = orjson.loads(response.content)
+    tree = tree_data.get('tree', [])
+    tree_cache[cache_key] = tree
+    return tree
+
+def cache_blob(blob_sha, file_content):
+    # cachetools rejects single items larger than the whole cache
+    if blob_sha and file_content is not None and len(file_content) <= BLOB_CACHE_MAX_CHARS:
+        blob_cache[blob_sha] = file_content
+
+async def fetch_file_content(client, item):
+    path = item['path']
+    blob_sha = item.get('sha')
+    if blob_sha in blob_cache:
+        return blob_cache[blob_sha]
+    logger.debug('Processing file: %s', path)
+    try:
+        # The raw media type returns the file bytes directly, without the base64 JSON envelope
+        blob_response = await client.get(item['url'], headers={'Accept': GITHUB_RAW_MEDIA_TYPE})
+        if blob_response.status_code == 415:
+            file_content = await fetch_file_content_base64(client, item)
+        elif blob_response.status_code != 200:
+            logger.error(f'Error fetching file {path}: {blob_response.status_code}')
+            return None
+        else:
+            file_content = blob_response.content.decode('utf-8', errors='replace')
+    except GitHubRateLimited:
+        # Dropping rate-limited files would produce a review of an incomplete project
+        raise
+    except Exception as e:
+        logger.error(f'Error reading file {path}: {str(e)}')
+        return None
+    # Blobs are content-addressed, so a sha always maps to the same content
+    cache_blob(blob_sha, file_content)
+    return file_content
+
+async def fetch_file_content_base64(client, item):
+    path = item['path']
+    blob_response = await client.get(item['url'])
+    if blob_response.status_code != 200:
+        logger.error(f'Error fetching file {path}: {blob_response.status_code}')
+        return None
+    blob_data = orjson.loads(blob_response.content)
+    content = blob_data.get('content', '')
+    encoding = blob_data.get('encoding', '')
+    if encoding != 'base64':
+        logger.warning(f'Unknown encoding format for file {path}')
+        return None
+    return base64.b64decode(content).decode('utf-8', errors='replace')
+
+def build_mistral_request(prompt, stream=False):
     api_key = os.getenv('MISTRAL_API_KEY')
     if not api_key:
         raise Exception('Mistral AI API key not found in environment variables.')
@@ -139,30 +446,12 @@ def get_mistral_review(prompt):
         "temperature": 0.9,
         "max_tokens": 1500,
         "min_tokens": 50,
-        "stream": False,
+        "stream": stream,
         "random_seed": None,
         "messages": [
             {
                 "role": "system",
-                "content": """You are a professional code developer. Your task is to provide a review of the candidate's project.
-
-                The structure of the response should be as follows:
-
-                1. **Drawbacks**:
-                - Brief mentions of what is missing, not done, or not considered.
-
-                2. **Evaluation**:
-                - Final score on a 5-point scale, based on the number and severity of errors and shortcomings.
-                - Remember that the score should consider the level the candidate is applying for:
-                    - **Junior**: Some errors and shortcomings are acceptable, as the candidate is just starting their career. A score of 5/5 means the candidate has shown excellent knowledge and potential for their level.
-                    - **Middle**: Confident mastery of basic technologies and practices is expected. A score of 5/5 means the candidate performs tasks above average.
-                    - **Senior**: A high level of professionalism is expected; the code should be close to ideal, following best practices and without errors. A score of 5/5 means the code is executed at an exceptional level.
-
-                3. **Improvement Tips**:
-                - Brief tips on how to improve the code.
-
-                4. **Conclusion**:
-                - A short summary of the code and the project's outcome."""
+                "content": SYSTEM_PROMPT
             },
             {
                 "role": "user",
@@ -175,26 +464,29 @@ def get_mistral_review(prompt):
         "tool_choice": "auto",
         "safe_prompt": True
     }
+    return headers, payload
+
+async def get_mistral_review(client, prompt):
+    headers, payload = build_mistral_request(prompt)
 
     try:
-        with httpx.Client() as client:
-            response = client.post(api_url, headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
-            response_json = response.json()
-            try:
-                choices = response_json.get('choices')
-                if not choices or not isinstance(choices, list):
-                    raise KeyError('Field "choices" is missing or has an incorrect format.')
-                message = choices[0].get('message')
-                if not message or not isinstance(message, dict):
-                    raise KeyError('Field "message" is missing or has an incorrect format.')
-                review_text = message.get('content')
-                if not review_text:
-                    raise KeyError('Field "content" is missing.')
-            except KeyError as e:
-                logger.error(f'Invalid response format from Mistral AI API: {e}')
-                raise Exception(f'Invalid response format from Mistral AI API: {e}')
-            return review_text
+        response = await client.post('/chat/completions', headers=headers, content=orjson.dumps(payload))
+        response.raise_for_status()
+        response_json = orjson.loads(response.content)
+        try:
+            choices = response_json.get('choices')
+            if not choices or not isinstance(choices, list):
+                raise KeyError('Field "choices" is missing or has an incorrect format.')
+            message = choices[0].get('message')
+            if not message or not isinstance(message, dict):
+                raise KeyError('Field "message" is missing or has an incorrect format.')
+            review_text = message.get('content')
+            if not review_text:
+                raise KeyError('Field "content" is missing.')
+        except KeyError as e:
+            logger.error(f'Invalid response format from Mistral AI API: {e}')
+            raise Exception(f'Invalid response format from Mistral AI API: {e}')
+        return review_text
     except httpx.HTTPStatusError as http_err:
         logger.error(f'HTTP error when accessing Mistral AI API: {http_err.response.status_code} - {http_err.response.text}')
         raise Exception('HTTP error when accessing Mistral AI API.')
@@ -202,38 +494,157 @@ def get_mistral_review(prompt):
         logger.error(f'Error when accessing Mistral AI API: {e}')
         raise Exception(f'Invalid response format from Mistral AI API: {e}')
 
+async def stream_mistral_review(client, prompt, on_complete=None, on_close=None):
+    headers, payload = build_mistral_request(prompt, stream=True)
+    # The status is checked before streaming starts so upstream errors still map to an HTTP error response
+    mistral_request = client.build_request('POST', '/chat/completions', headers=headers, content=orjson.dumps(payload))
+    response = await client.send(mistral_request, stream=True)
+    if response.is_error:
+        await response.aread()
+        await response.aclose()
+        logger.error(f'HTTP error when accessing Mistral AI API: {response.status_code} - {response.text}')
+        raise Exception('HTTP error when accessing Mistral AI API.')
+    return forward_mistral_events(response, on_complete, on_close)
+
+async def forward_mistral_events(response, on_complete=None, on_close=None):
+    review_parts = []
+    done = False
+    try:
+        async for line in response.aiter_lines():
+            if not line.startswith('data:'):
+                continue
+            data = line[len('data:'):].strip()
+            if data == '[DONE]':
+                done = True
+                break
+            choices = orjson.loads(data).get('choices') or []
+            if not choices:
+                continue
+            content = (choices[0].get('delta') or {}).get('content')
+            if content:
+                review_parts.append(content)
+                yield f'data: {orjson.dumps({"review": content}).decode()}\n\n'
+        # A stream cut short before [DONE] carries only part of the review
+        if on_complete is not None and done and review_parts:
+            await on_complete(''.join(review_parts))
+        yield 'data: [DONE]\n\n'
+    except Exception as e:
+        logger.error(f'Error when streaming from Mistral AI API: {e}')
+        yield f'event: error\ndata: {orjson.dumps({"detail": "Error when streaming from Mistral AI API."}).decode()}\n\n'
+    finally:
+        await response.aclose()
+        if on_close is not None:
+            on_close()
+
+def release_once(semaphore):
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            semaphore.release()
+    return release
+
+async def cached_review_events(review_text):
+    yield f'data: {orjson.dumps({"review": review_text}).decode()}\n\n'
+    yield 'data: [DONE]\n\n'
+
+def get_review_cache_key(prompt):
+    # The whole request payload is hashed, so changing the model or sampling settings invalidates old reviews
+    _, payload = build_mistral_request(prompt)
+    return hashlib.sha256(orjson.dumps(payload)).hexdigest()
+
+def build_prompt(project_code, candidate_level, assignment_description, encoding=None, max_tokens=MAX_PROMPT_TOKENS):
+    # Escape project code
+    safe_project_code = html.escape(project_code)
+
+    prompt = f"""
+    Please analyze the following project, paying particular attention to the fact that the candidate is applying for the {candidate_level} level, and provide feedback according to the response structure.
+
+    Short project description: {assignment_description}
+
+    Project code:
+    {safe_project_code}
+    Please provide your feedback considering the {candidate_level} vacancy level.
+    """
+
+    if encoding is not None:
+        # Special-token text inside candidate code must be encoded as plain text, not rejected
+        token_ids = encoding.encode(prompt, disallowed_special=())
+        if len(token_ids) > max_tokens:
+            prompt = encoding.decode(token_ids[:max_tokens])
+            prompt += '\n\n// Prompt truncated due to size limitations.'
+    elif len(prompt) > MAX_PROMPT_LENGTH:
+        prompt = prompt[:MAX_PROMPT_LENGTH]
+        prompt += '\n\n// Prompt truncated due to size limitations.'
+    return prompt
+
 @app.post("/review")
-async def review(review_request: ReviewRequest):
+async def review(review_request: ReviewRequest, request: Request, stream: bool = False):
     try:
         assignment_description = review_request.assignment_description
-        github_url_repo = review_request.github_url_repo
         candidate_level = review_request.candidate_level
 
-        project_code = await collect_code_from_github_repo(github_url_repo)
-
-        # Escape project code
-        safe_project_code = html.escape(project_code)
-
-        prompt = f"""
-        Please analyze the following project, paying particular attention to the fact that the candidate is applying for the {candidate_level} level, and provide feedback according to the response structure.
-
-        Short project description: {assignment_description}
-
-        Project code:
-        {safe_project_code}
-        Please provide your feedback considering the {candidate_level} vacancy level.
-        """
-
-        if len(prompt) > 20000:
-            prompt = prompt[:20000]
-            prompt += '\n\n// Prompt truncated due to size limitations.'
-
-        logger.info('Sending request to Mistral AI for review.')
-        review_text = get_mistral_review(prompt)
-        return {'review': review_text}
+        # Bound in-flight reviews so bursts stay within GitHub and Mistral rate limits
+        review_semaphore = request.app.state.review_semaphore
+        release_slot = release_once(review_semaphore)
+        stream_holds_slot = False
+        await review_semaphore.acquire()
+        try:
+            project_code, project_complete = await collect_code_from_github_repo(
+                request.app.state.gh_client, review_request.owner, review_request.repo_name
+            )
+
+            # Escaping and truncating a large prompt is CPU work, so it runs off the event loop
+            prompt = await asyncio.to_thread(
+                build_prompt,
+                project_code,
+                candidate_level,
+                assignment_description,
+                request.app.state.token_encoding,
+                request.app.state.prompt_token_budget
+            )
+
+            review_cache = request.app.state.review_cache
+            cache_key = get_review_cache_key(prompt)
+            if not project_complete:
+                logger.warning('Some files could not be fetched; the review will not be cached.')
+            review_text = await asyncio.to_thread(review_cache.get, cache_key)
+            if review_text is not None:
+                logger.info('Returning cached review.')
+                if stream:
+                    return StreamingResponse(cached_review_events(review_text), media_type='text/event-stream')
+                return {'review': review_text}
+
+            async def store_review(text):
+                # A review of a partially collected project must not be served for later requests
+                if not project_complete or not text:
+                    return
+                await asyncio.to_thread(review_cache.set, cache_key, text, expire=REVIEW_CACHE_TTL)
+
+            logger.info('Sending request to Mistral AI for review.')
+            if stream:
+                review_events = await stream_mistral_review(
+                    request.app.state.mistral_client, prompt, store_review, release_slot
+                )
+                # The slot is held until the stream ends; the background task also covers a stream that never starts
+                stream_holds_slot = True
+                return StreamingResponse(
+                    review_events, media_type='text/event-stream', background=BackgroundTask(release_slot)
+                )
+            review_text = await get_mistral_review(request.app.state.mistral_client, prompt)
+            await store_review(review_text)
+            return {'review': review_text}
+        finally:
+            if not stream_holds_slot:
+                release_slot()
 
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
+    except GitHubRateLimited as rl:
+        logger.error(f'GitHub rate limit exceeded: {str(rl)}')
+        raise HTTPException(status_code=503, detail='GitHub API rate limit exceeded. Please try again later.')
     except httpx.HTTPStatusError as he:
         logger.error(f'Error accessing GitHub: {str(he)}')
         raise HTTPException(status_code=400, detail='Failed to access GitHub repository. Check the URL and access rights.')
@@ -1,11 +1,25 @@
 import pytest
 from fastapi.testclient import TestClient
-from app import app
+from app import app, ReviewRequest, build_mistral_request, get_review_cache_key, tree_cache, blob_cache, etag_cache, load_token_encoding, build_prompt, MAX_PROMPT_TOKENS, SYSTEM_PROMPT
 import respx
+import json
+import httpx
+import asyncio
+from types import SimpleNamespace
 
 
 @pytest.fixture
-def client():
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.REVIEW_CACHE_DIR", str(tmp_path / "reviews"))
+
+    # Keep the startup encoding download off the network; prompts use the character cap
+    async def skip_token_encoding(app):
+        pass
+
+    monkeypatch.setattr("app.load_token_encoding", skip_token_encoding)
+    tree_cache.clear()
+    blob_cache.clear()
+    etag_cache.clear()
     with TestClient(app) as c:
         yield c
 
@@ -23,7 +37,13 @@ def test_review_success(client):
             json={"default_branch": "main"}
         )
 
-        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/main?recursive=1"
+        commit_api_url = "https://api.github.com/repos/testuser/testrepo/commits/main"
+        mock.get(commit_api_url).respond(
+            status_code=200,
+            text="commitsha"
+        )
+
+        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/commitsha?recursive=1"
         mock.get(tree_api_url).respond(
             status_code=200,
             json={
@@ -31,7 +51,8 @@ def test_review_success(client):
                     {
                         "path": "main.py",
                         "type": "blob",
-                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1"
+                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1",
+                        "sha": "sha1"
                     }
                 ]
             }
@@ -40,10 +61,7 @@ def test_review_success(client):
         blob_url = "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1"
         mock.get(blob_url).respond(
             status_code=200,
-            json={
-                "content": "cHJpbnQoJ0hlbGxvLCBXb3JsZCEnKQ==",
-                "encoding": "base64"
-            }
+            text="print('Hello, World!')"
         )
 
         mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
@@ -90,6 +108,32 @@ def test_review_invalid_github_url(client):
     assert "errors" in json_response
     assert "Value error, Invalid GitHub repository URL." in json_response["errors"]
 
+def test_review_non_repository_github_url(client):
+    data = {
+        "assignment_description": "Project description",
+        "github_url_repo": "https://github.com/testuser",
+        "candidate_level": "Middle"
+    }
+    response = client.post("/review", json=data)
+    assert response.status_code == 422
+    json_response = response.json()
+    assert "errors" in json_response
+    assert "Value error, URL must be a GitHub repository." in json_response["errors"]
+
+@pytest.mark.parametrize("github_url_repo", [
+    "https://github.com/testuser/testrepo",
+    "https://github.com/testuser/testrepo.git",
+    "https://github.com/testuser/testrepo/tree/main/src",
+])
+def test_review_request_extracts_repository(github_url_repo):
+    review_request = ReviewRequest(
+        assignment_description="Project description",
+        github_url_repo=github_url_repo,
+        candidate_level="Middle"
+    )
+    assert review_request.owner == "testuser"
+    assert review_request.repo_name == "testrepo"
+
 def test_review_missing_fields(client):
     data = {
         "github_url_repo": "https://github.com/testuser/testrepo",
@@ -134,7 +178,13 @@ def test_review_mistral_api_error(client):
             json={"default_branch": "main"}
         )
 
-        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/main?recursive=1"
+        commit_api_url = "https://api.github.com/repos/testuser/testrepo/commits/main"
+        mock.get(commit_api_url).respond(
+            status_code=200,
+            text="commitsha"
+        )
+
+        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/commitsha?recursive=1"
         mock.get(tree_api_url).respond(
             status_code=200,
             json={
@@ -142,7 +192,8 @@ def test_review_mistral_api_error(client):
                     {
                         "path": "main.py",
                         "type": "blob",
-                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1"
+                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1",
+                        "sha": "sha1"
                     }
                 ]
             }
@@ -151,10 +202,7 @@ def test_review_mistral_api_error(client):
         blob_url = "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1"
         mock.get(blob_url).respond(
             status_code=200,
-            json={
-                "content": "cHJpbnQoJ0hlbGxvLCBXb3JsZCEnKQ==",
-                "encoding": "base64"
-            }
+            text="print('Hello, World!')"
         )
 
         mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
@@ -168,3 +216,881 @@ def test_review_mistral_api_error(client):
         json_response = response.json()
         assert "detail" in json_response
         assert json_response["detail"] == "HTTP error when accessing Mistral AI API."
+
+def test_review_collects_files_in_tree_order(client):
+    data = {
+        "assignment_description": "Project description",
+        "github_url_repo": "https://github.com/testuser/testrepo",
+        "candidate_level": "Middle"
+    }
+
+    with respx.mock(assert_all_called=True) as mock:
+        repo_api_url = "https://api.github.com/repos/testuser/testrepo"
+        mock.get(repo_api_url).respond(
+            status_code=200,
+            json={"default_branch": "main"}
+        )
+
+        commit_api_url = "https://api.github.com/repos/testuser/testrepo/commits/main"
+        mock.get(commit_api_url).respond(
+            status_code=200,
+            text="commitsha"
+        )
+
+        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/commitsha?recursive=1"
+        mock.get(tree_api_url).respond(
+            status_code=200,
+            json={
+                "tree": [
+                    {
+                        "path": "first.py",
+                        "type": "blob",
+                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1",
+                        "sha": "sha1"
+                    },
+                    {
+                        "path": "README.md",
+                        "type": "blob",
+                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha2",
+                        "sha": "sha2"
+                    },
+                    {
+                        "path": "second.py",
+                        "type": "blob",
+                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha3",
+                        "sha": "sha3"
+                    }
+                ]
+            }
+        )
+
+        mock.get("https://api.github.com/repos/testuser/testrepo/git/blobs/sha1").respond(
+            status_code=200,
+            text="print(1)"
+        )
+        mock.get("https://api.github.com/repos/testuser/testrepo/git/blobs/sha3").respond(
+            status_code=200,
+            text="print(2)"
+        )
+
+        mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
+        mistral_route = mock.post(mistral_api_url).respond(
+            status_code=200,
+            json={"choices": [{"message": {"content": "Review"}}]}
+        )
+
+        response = client.post("/review", json=data)
+        assert response.status_code == 200
+        prompt = json.loads(mistral_route.calls.last.request.content)["messages"][1]["content"]
+        assert prompt.index("// File: first.py") < prompt.index("// File: second.py")
+        assert "// File: README.md" not in prompt
+        assert "README.md" in prompt
+
+def test_review_cuts_files_in_tree_order_regardless_of_arrival(client):
+    data = {
+        "assignment_description": "Project description",
+        "github_url_repo": "https://github.com/testuser/testrepo",
+        "candidate_level": "Middle"
+    }
+
+    async def delayed_small_blob(request):
+        await asyncio.sleep(0.05)
+        return httpx.Response(status_code=200, text="print(2)")
+
+    with respx.mock(assert_all_called=True) as mock:
+        repo_api_url = "https://api.github.com/repos/testuser/testrepo"
+        mock.get(repo_api_url).respond(
+            status_code=200,
+            json={"default_branch": "main"}
+        )
+
+        commit_api_url = "https://api.github.com/repos/testuser/testrepo/commits/main"
+        mock.get(commit_api_url).respond(
+            status_code=200,
+            text="commitsha"
+        )
+
+        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/commitsha?recursive=1"
+        mock.get(tree_api_url).respond(
+            status_code=200,
+            json={
+                "tree": [
+                    {
+                        "path": "first.py",
+                        "type": "blob",
+                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1",
+                        "sha": "sha1",
+                        "size": 19000
+                    },
+                    {
+                        "path": "second.py",
+                        "type": "blob",
+                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha2",
+                        "sha": "sha2",
+                        "size": 8
+                    },
+                    {
+                        "path": "third.py",
+                        "type": "blob",
+                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha3",
+                        "sha": "sha3",
+                        "size": 5000
+                    }
+                ]
+            }
+        )
+
+        mock.get("https://api.github.com/repos/testuser/testrepo/git/blobs/sha1").respond(
+            status_code=200,
+            text="a" * 19000
+        )
+        mock.get("https://api.github.com/repos/testuser/testrepo/git/blobs/sha2").mock(
+            side_effect=delayed_small_blob
+        )
+        mock.get("https://api.github.com/repos/testuser/testrepo/git/blobs/sha3").respond(
+            status_code=200,
+            text="b" * 5000
+        )
+
+        mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
+        mistral_route = mock.post(mistral_api_url).respond(
+            status_code=200,
+            json={"choices": [{"message": {"content": "Review"}}]}
+        )
+
+        response = client.post("/review", json=data)
+        assert response.status_code == 200
+        prompt = json.loads(mistral_route.calls.last.request.content)["messages"][1]["content"]
+        assert prompt.index("// File: first.py") < prompt.index("// File: second.py") < prompt.index("// File: third.py")
+        assert "print(2)" in prompt
+
+def test_review_falls_back_to_base64_blob(client):
+    data = {
+        "assignment_description": "Project description",
+        "github_url_repo": "https://github.com/testuser/testrepo",
+        "candidate_level": "Middle"
+    }
+
+    with respx.mock(assert_all_called=True) as mock:
+        repo_api_url = "https://api.github.com/repos/testuser/testrepo"
+        mock.get(repo_api_url).respond(
+            status_code=200,
+            json={"default_branch": "main"}
+        )
+
+        commit_api_url = "https://api.github.com/repos/testuser/testrepo/commits/main"
+        mock.get(commit_api_url).respond(
+            status_code=200,
+            text="commitsha"
+        )
+
+        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/commitsha?recursive=1"
+        mock.get(tree_api_url).respond(
+            status_code=200,
+            json={
+                "tree": [
+                    {
+                        "path": "main.py",
+                        "type": "blob",
+                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1",
+                        "sha": "sha1"
+                    }
+                ]
+            }
+        )
+
+        blob_url = "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1"
+        mock.get(blob_url).mock(side_effect=[
+            httpx.Response(status_code=415),
+            httpx.Response(
+                status_code=200,
+                json={
+                    "content": "cHJpbnQoJ0hlbGxvLCBXb3JsZCEnKQ==",
+                    "encoding": "base64"
+                }
+            )
+        ])
+
+        mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
+        mistral_route = mock.post(mistral_api_url).respond(
+            status_code=200,
+            json={"choices": [{"message": {"content": "Review"}}]}
+        )
+
+        response = client.post("/review", json=data)
+        assert response.status_code == 200
+        prompt = json.loads(mistral_route.calls.last.request.content)["messages"][1]["content"]
+        assert "print(&#x27;Hello, World!&#x27;)" in prompt
+
+def test_review_reuses_cached_tree_and_blobs(client):
+    data = {
+        "assignment_description": "Project description",
+        "github_url_repo": "https://github.com/testuser/testrepo",
+        "candidate_level": "Middle"
+    }
+
+    with respx.mock(assert_all_called=True) as mock:
+        repo_api_url = "https://api.github.com/repos/testuser/testrepo"
+        mock.get(repo_api_url).respond(
+            status_code=200,
+            json={"default_branch": "main"}
+        )
+
+        commit_api_url = "https://api.github.com/repos/testuser/testrepo/commits/main"
+        mock.get(commit_api_url).respond(
+            status_code=200,
+            text="commitsha"
+        )
+
+        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/commitsha?recursive=1"
+        tree_route = mock.get(tree_api_url).respond(
+            status_code=200,
+            json={
+                "tree": [
+                    {
+                        "path": "main.py",
+                        "type": "blob",
+                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1",
+                        "sha": "sha1"
+                    }
+                ]
+            }
+        )
+
+        blob_url = "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1"
+        blob_route = mock.get(blob_url).respond(
+            status_code=200,
+            text="print('Hello, World!')"
+        )
+
+        mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
+        mock.post(mistral_api_url).respond(
+            status_code=200,
+            json={"choices": [{"message": {"content": "Review"}}]}
+        )
+
+        assert client.post("/review", json=data).status_code == 200
+        assert client.post("/review", json=data).status_code == 200
+        assert tree_route.call_count == 1
+        assert blob_route.call_count == 1
+
+def test_review_streams_mistral_events(client):
+    data = {
+        "assignment_description": "Project description",
+        "github_url_repo": "https://github.com/testuser/testrepo",
+        "candidate_level": "Middle"
+    }
+
+    with respx.mock(assert_all_called=True) as mock:
+        repo_api_url = "https://api.github.com/repos/testuser/testrepo"
+        mock.get(repo_api_url).respond(
+            status_code=200,
+            json={"default_branch": "main"}
+        )
+
+        commit_api_url = "https://api.github.com/repos/testuser/testrepo/commits/main"
+        mock.get(commit_api_url).respond(
+            status_code=200,
+            text="commitsha"
+        )
+
+        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/commitsha?recursive=1"
+        mock.get(tree_api_url).respond(
+            status_code=200,
+            json={"tree": []}
+        )
+
+        mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
+        mock.post(mistral_api_url).respond(
+            status_code=200,
+            headers={"Content-Type": "text/event-stream"},
+            text=(
+                'data: {"choices": [{"delta": {"content": "Good "}}]}\n\n'
+                'data: {"choices": [{"delta": {"content": "work."}}]}\n\n'
+                'data: [DONE]\n\n'
+            )
+        )
+
+        response = client.post("/review?stream=true", json=data)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [line[len("data: "):] for line in response.text.splitlines() if line.startswith("data: ")]
+        assert events[-1] == "[DONE]"
+        assert "".join(json.loads(event)["review"] for event in events[:-1]) == "Good work."
+
+def test_review_stream_without_done_is_not_cached(client):
+    data = {
+        "assignment_description": "Project description",
+        "github_url_repo": "https://github.com/testuser/testrepo",
+        "candidate_level": "Middle"
+    }
+
+    with respx.mock(assert_all_called=True) as mock:
+        repo_api_url = "https://api.github.com/repos/testuser/testrepo"
+        mock.get(repo_api_url).respond(
+            status_code=200,
+            json={"default_branch": "main"}
+        )
+
+        commit_api_url = "https://api.github.com/repos/testuser/testrepo/commits/main"
+        mock.get(commit_api_url).respond(
+            status_code=200,
+            text="commitsha"
+        )
+
+        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/commitsha?recursive=1"
+        mock.get(tree_api_url).respond(
+            status_code=200,
+            json={"tree": []}
+        )
+
+        mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
+        mistral_route = mock.post(mistral_api_url).mock(side_effect=[
+            httpx.Response(
+                status_code=200,
+                headers={"Content-Type": "text/event-stream"},
+                text='data: {"choices": [{"delta": {"content": "Good "}}]}\n\n'
+            ),
+            httpx.Response(
+                status_code=200,
+                headers={"Content-Type": "text/event-stream"},
+                text='data: {"choices": [{"delta": {}}]}\n\ndata: [DONE]\n\n'
+            ),
+            httpx.Response(
+                status_code=200,
+                json={"choices": [{"message": {"content": "Review"}}]}
+            )
+        ])
+
+        response = client.post("/review?stream=true", json=data)
+        assert response.status_code == 200
+        response = client.post("/review?stream=true", json=data)
+        assert response.status_code == 200
+        response = client.post("/review", json=data)
+        assert response.status_code == 200
+        assert response.json()["review"] == "Review"
+        assert mistral_route.call_count == 3
+
+def test_review_retries_github_rate_limit(client):
+    data = {
+        "assignment_description": "Project description",
+        "github_url_repo": "https://github.com/testuser/testrepo",
+        "candidate_level": "Middle"
+    }
+
+    with respx.mock(assert_all_called=True) as mock:
+        repo_api_url = "https://api.github.com/repos/testuser/testrepo"
+        repo_route = mock.get(repo_api_url).mock(side_effect=[
+            httpx.Response(status_code=429, headers={"Retry-After": "0"}),
+            httpx.Response(status_code=403, headers={"Retry-After": "0"}),
+            httpx.Response(status_code=200, json={"default_branch": "main"})
+        ])
+
+        commit_api_url = "https://api.github.com/repos/testuser/testrepo/commits/main"
+        mock.get(commit_api_url).respond(
+            status_code=200,
+            text="commitsha"
+        )
+
+        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/commitsha?recursive=1"
+        mock.get(tree_api_url).respond(
+            status_code=200,
+            json={"tree": []}
+        )
+
+        mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
+        mock.post(mistral_api_url).respond(
+            status_code=200,
+            json={"choices": [{"message": {"content": "Review"}}]}
+        )
+
+        response = client.post("/review", json=data)
+        assert response.status_code == 200
+        assert repo_route.call_count == 3
+
+def test_review_github_rate_limit_exhausted(client):
+    data = {
+        "assignment_description": "Project description",
+        "github_url_repo": "https://github.com/testuser/testrepo",
+        "candidate_level": "Middle"
+    }
+
+    with respx.mock(assert_all_called=True) as mock:
+        repo_api_url = "https://api.github.com/repos/testuser/testrepo"
+        repo_route = mock.get(repo_api_url).respond(
+            status_code=429,
+            headers={"Retry-After": "0"}
+        )
+
+        response = client.post("/review", json=data)
+        assert response.status_code == 503
+        assert response.json()["detail"] == "GitHub API rate limit exceeded. Please try again later."
+        assert repo_route.call_count == 5
+
+def test_review_revalidates_repository_metadata_with_etag(client):
+    data = {
+        "assignment_description": "Project description",
+        "github_url_repo": "https://github.com/testuser/testrepo",
+        "candidate_level": "Middle"
+    }
+
+    with respx.mock(assert_all_called=True) as mock:
+        repo_api_url = "https://api.github.com/repos/testuser/testrepo"
+        repo_route = mock.get(repo_api_url).mock(side_effect=[
+            httpx.Response(status_code=200, headers={"ETag": '"repo-etag"'}, json={"default_branch": "main"}),
+            httpx.Response(status_code=304)
+        ])
+
+        commit_api_url = "https://api.github.com/repos/testuser/testrepo/commits/main"
+        mock.get(commit_api_url).mock(side_effect=[
+            httpx.Response(status_code=200, headers={"ETag": '"commit-etag"'}, text="commitsha"),
+            httpx.Response(status_code=304)
+        ])
+
+        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/commitsha?recursive=1"
+        mock.get(tree_api_url).respond(
+            status_code=200,
+            json={"tree": []}
+        )
+
+        mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
+        mock.post(mistral_api_url).respond(
+            status_code=200,
+            json={"choices": [{"message": {"content": "Review"}}]}
+        )
+
+        assert client.post("/review", json=data).status_code == 200
+        assert client.post("/review", json=data).status_code == 200
+        assert "If-None-Match" not in repo_route.calls[0].request.headers
+        assert repo_route.calls[1].request.headers["If-None-Match"] == '"repo-etag"'
+
+def test_review_fetches_blobs_with_graphql(client, monkeypatch):
+    monkeypatch.setattr("app.GITHUB_TOKEN", "test-token")
+    data = {
+        "assignment_description": "Project description",
+        "github_url_repo": "https://github.com/testuser/testrepo",
+        "candidate_level": "Middle"
+    }
+
+    with respx.mock(assert_all_called=True) as mock:
+        repo_api_url = "https://api.github.com/repos/testuser/testrepo"
+        mock.get(repo_api_url).respond(
+            status_code=200,
+            json={"default_branch": "main"}
+        )
+
+        commit_api_url = "https://api.github.com/repos/testuser/testrepo/commits/main"
+        mock.get(commit_api_url).respond(
+            status_code=200,
+            text="commitsha"
+        )
+
+        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/commitsha?recursive=1"
+        mock.get(tree_api_url).respond(
+            status_code=200,
+            json={
+                "tree": [
+                    {
+                        "path": "first.py",
+                        "type": "blob",
+                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1",
+                        "sha": "sha1"
+                    },
+                    {
+                        "path": "second.py",
+                        "type": "blob",
+                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha2",
+                        "sha": "sha2"
+                    }
+                ]
+            }
+        )
+
+        graphql_api_url = "https://api.github.com/graphql"
+        graphql_route = mock.post(graphql_api_url).respond(
+            status_code=200,
+            json={
+                "data": {
+                    "repository": {
+                        "f0": {"text": "print(1)", "isBinary": False},
+                        "f1": {"text": "print(2)", "isBinary": False}
+                    }
+                }
+            }
+        )
+
+        mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
+        mistral_route = mock.post(mistral_api_url).respond(
+            status_code=200,
+            json={"choices": [{"message": {"content": "Review"}}]}
+        )
+
+        response = client.post("/review", json=data)
+        assert response.status_code == 200
+        assert graphql_route.call_count == 1
+        variables = json.loads(graphql_route.calls.last.request.content)["variables"]
+        assert variables["oid0"] == "sha1"
+        assert variables["oid1"] == "sha2"
+        prompt = json.loads(mistral_route.calls.last.request.content)["messages"][1]["content"]
+        assert prompt.index("print(1)") < prompt.index("print(2)")
+
+def test_review_skips_files_beyond_size_budget(client):
+    data = {
+        "assignment_description": "Project description",
+        "github_url_repo": "https://github.com/testuser/testrepo",
+        "candidate_level": "Middle"
+    }
+
+    with respx.mock(assert_all_called=False) as mock:
+        repo_api_url = "https://api.github.com/repos/testuser/testrepo"
+        mock.get(repo_api_url).respond(
+            status_code=200,
+            json={"default_branch": "main"}
+        )
+
+        commit_api_url = "https://api.github.com/repos/testuser/testrepo/commits/main"
+        mock.get(commit_api_url).respond(
+            status_code=200,
+            text="commitsha"
+        )
+
+        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/commitsha?recursive=1"
+        mock.get(tree_api_url).respond(
+            status_code=200,
+            json={
+                "tree": [
+                    {
+                        "path": "main.py",
+                        "type": "blob",
+                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1",
+                        "sha": "sha1",
+                        "size": 20000
+                    },
+                    {
+                        "path": "large.py",
+                        "type": "blob",
+                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha2",
+                        "sha": "sha2",
+                        "size": 25000
+                    }
+                ]
+            }
+        )
+
+        main_route = mock.get("https://api.github.com/repos/testuser/testrepo/git/blobs/sha1").respond(
+            status_code=200,
+            text="x = 1\n" * 3300
+        )
+        large_route = mock.get("https://api.github.com/repos/testuser/testrepo/git/blobs/sha2").respond(
+            status_code=200,
+            text="y = 2\n" * 4100
+        )
+
+        mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
+        mock.post(mistral_api_url).respond(
+            status_code=200,
+            json={"choices": [{"message": {"content": "Review"}}]}
+        )
+
+        response = client.post("/review", json=data)
+        assert response.status_code == 200
+        assert main_route.call_count == 1
+        assert large_route.call_count == 0
+
+def test_review_truncates_single_file_beyond_size_budget(client):
+    data = {
+        "assignment_description": "Project description",
+        "github_url_repo": "https://github.com/testuser/testrepo",
+        "candidate_level": "Middle"
+    }
+
+    with respx.mock(assert_all_called=True) as mock:
+        repo_api_url = "https://api.github.com/repos/testuser/testrepo"
+        mock.get(repo_api_url).respond(
+            status_code=200,
+            json={"default_branch": "main"}
+        )
+
+        commit_api_url = "https://api.github.com/repos/testuser/testrepo/commits/main"
+        mock.get(commit_api_url).respond(
+            status_code=200,
+            text="commitsha"
+        )
+
+        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/commitsha?recursive=1"
+        mock.get(tree_api_url).respond(
+            status_code=200,
+            json={
+                "tree": [
+                    {
+                        "path": "main.py",
+                        "type": "blob",
+                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1",
+                        "sha": "sha1",
+                        "size": 21000
+                    }
+                ]
+            }
+        )
+
+        mock.get("https://api.github.com/repos/testuser/testrepo/git/blobs/sha1").respond(
+            status_code=200,
+            text="x = 1\n" * 3500
+        )
+
+        mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
+        mistral_route = mock.post(mistral_api_url).respond(
+            status_code=200,
+            json={"choices": [{"message": {"content": "Review"}}]}
+        )
+
+        response = client.post("/review", json=data)
+        assert response.status_code == 200
+        prompt = json.loads(mistral_route.calls.last.request.content)["messages"][1]["content"]
+        assert "// File: main.py" in prompt
+        assert "x = 1" in prompt
+        assert prompt.endswith("truncated due to size limitations.")
+
+def test_review_returns_cached_review(client):
+    data = {
+        "assignment_description": "Project description",
+        "github_url_repo": "https://github.com/testuser/testrepo",
+        "candidate_level": "Middle"
+    }
+
+    with respx.mock(assert_all_called=True) as mock:
+        repo_api_url = "https://api.github.com/repos/testuser/testrepo"
+        mock.get(repo_api_url).respond(
+            status_code=200,
+            json={"default_branch": "main"}
+        )
+
+        commit_api_url = "https://api.github.com/repos/testuser/testrepo/commits/main"
+        mock.get(commit_api_url).respond(
+            status_code=200,
+            text="commitsha"
+        )
+
+        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/commitsha?recursive=1"
+        mock.get(tree_api_url).respond(
+            status_code=200,
+            json={"tree": []}
+        )
+
+        mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
+        mistral_route = mock.post(mistral_api_url).respond(
+            status_code=200,
+            json={"choices": [{"message": {"content": "Cached review"}}]}
+        )
+
+        first_response = client.post("/review", json=data)
+        second_response = client.post("/review?stream=true", json=data)
+        assert first_response.json()["review"] == "Cached review"
+        assert second_response.status_code == 200
+        assert 'data: {"review":"Cached review"}' in second_response.text
+        assert mistral_route.call_count == 1
+
+def test_review_stream_holds_concurrency_slot(client):
+    data = {
+        "assignment_description": "Project description",
+        "github_url_repo": "https://github.com/testuser/testrepo",
+        "candidate_level": "Middle"
+    }
+    review_semaphore = app.state.review_semaphore
+    free_slots = review_semaphore._value
+    free_slots_during_stream = []
+
+    async def mistral_events():
+        free_slots_during_stream.append(review_semaphore._value)
+        yield b'data: {"choices": [{"delta": {"content": "Good work."}}]}\n\n'
+        free_slots_during_stream.append(review_semaphore._value)
+        yield b'data: [DONE]\n\n'
+
+    with respx.mock(assert_all_called=True) as mock:
+        repo_api_url = "https://api.github.com/repos/testuser/testrepo"
+        mock.get(repo_api_url).respond(
+            status_code=200,
+            json={"default_branch": "main"}
+        )
+
+        commit_api_url = "https://api.github.com/repos/testuser/testrepo/commits/main"
+        mock.get(commit_api_url).respond(
+            status_code=200,
+            text="commitsha"
+        )
+
+        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/commitsha?recursive=1"
+        mock.get(tree_api_url).respond(
+            status_code=200,
+            json={"tree": []}
+        )
+
+        mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
+        mock.post(mistral_api_url).mock(side_effect=lambda request: httpx.Response(
+            status_code=200,
+            headers={"Content-Type": "text/event-stream"},
+            content=mistral_events()
+        ))
+
+        response = client.post("/review?stream=true", json=data)
+        assert response.status_code == 200
+        assert "Good work." in response.text
+        assert free_slots_during_stream == [free_slots - 1, free_slots - 1]
+        assert review_semaphore._value == free_slots
+
+def test_review_rate_limited_blob(client):
+    data = {
+        "assignment_description": "Project description",
+        "github_url_repo": "https://github.com/testuser/testrepo",
+        "candidate_level": "Middle"
+    }
+
+    with respx.mock(assert_all_called=False) as mock:
+        repo_api_url = "https://api.github.com/repos/testuser/testrepo"
+        mock.get(repo_api_url).respond(
+            status_code=200,
+            json={"default_branch": "main"}
+        )
+
+        commit_api_url = "https://api.github.com/repos/testuser/testrepo/commits/main"
+        mock.get(commit_api_url).respond(
+            status_code=200,
+            text="commitsha"
+        )
+
+        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/commitsha?recursive=1"
+        mock.get(tree_api_url).respond(
+            status_code=200,
+            json={
+                "tree": [
+                    {
+                        "path": "main.py",
+                        "type": "blob",
+                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1",
+                        "sha": "sha1"
+                    }
+                ]
+            }
+        )
+
+        blob_url = "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1"
+        mock.get(blob_url).respond(
+            status_code=429,
+            headers={"Retry-After": "0"}
+        )
+
+        mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
+        mistral_route = mock.post(mistral_api_url).respond(
+            status_code=200,
+            json={"choices": [{"message": {"content": "Review"}}]}
+        )
+
+        response = client.post("/review", json=data)
+        assert response.status_code == 503
+        assert response.json()["detail"] == "GitHub API rate limit exceeded. Please try again later."
+        assert mistral_route.call_count == 0
+
+def test_token_encoding_load_retries_after_failure(monkeypatch):
+    class FakeEncoding:
+        def encode(self, text, **kwargs):
+            return text.split()
+
+    attempts = []
+
+    def get_encoding(name):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise ConnectionError("DNS failure")
+        return FakeEncoding()
+
+    monkeypatch.setattr("app.tiktoken.get_encoding", get_encoding)
+    monkeypatch.setattr("app.TOKEN_ENCODING_RETRY_DELAY", 0)
+    fake_app = SimpleNamespace(state=SimpleNamespace())
+
+    asyncio.run(load_token_encoding(fake_app))
+
+    assert attempts == ["cl100k_base", "cl100k_base"]
+    assert isinstance(fake_app.state.token_encoding, FakeEncoding)
+    assert fake_app.state.prompt_token_budget == MAX_PROMPT_TOKENS - len(SYSTEM_PROMPT.split())
+
+def test_build_prompt_cuts_to_token_budget():
+    class FakeEncoding:
+        def encode(self, text, disallowed_special="all"):
+            if "<|endoftext|>" in text and disallowed_special != ():
+                raise ValueError("Encountered text corresponding to disallowed special token")
+            return text.split(" ")
+
+        def decode(self, tokens):
+            return " ".join(tokens)
+
+    # The assignment description is not escaped, so special-token text reaches the encoder as is
+    prompt = build_prompt("word " * 100, "Junior", "Text <|endoftext|> here", encoding=FakeEncoding(), max_tokens=20)
+
+    assert prompt.endswith("\n\n// Prompt truncated due to size limitations.")
+    assert len(prompt[:-len("\n\n// Prompt truncated due to size limitations.")].split(" ")) == 20
+
+    short_prompt = build_prompt("print(1)", "Junior", "Text <|endoftext|> here", encoding=FakeEncoding(), max_tokens=1000)
+    assert "<|endoftext|>" in short_prompt
+    assert "truncated" not in short_prompt
+
+def test_review_cache_key_covers_request_settings(monkeypatch):
+    monkeypatch.setenv("MISTRAL_API_KEY", "x")
+    cache_key = get_review_cache_key("prompt")
+
+    def build_with_other_temperature(prompt, stream=False):
+        headers, payload = build_mistral_request(prompt, stream)
+        payload["temperature"] = 0.1
+        return headers, payload
+
+    monkeypatch.setattr("app.build_mistral_request", build_with_other_temperature)
+    assert get_review_cache_key("prompt") != cache_key
+
+def test_review_not_cached_when_files_missing(client):
+    data = {
+        "assignment_description": "Project description",
+        "github_url_repo": "https://github.com/testuser/testrepo",
+        "candidate_level": "Middle"
+    }
+
+    with respx.mock(assert_all_called=True) as mock:
+        repo_api_url = "https://api.github.com/repos/testuser/testrepo"
+        mock.get(repo_api_url).respond(
+            status_code=200,
+            json={"default_branch": "main"}
+        )
+
+        commit_api_url = "https://api.github.com/repos/testuser/testrepo/commits/main"
+        mock.get(commit_api_url).respond(
+            status_code=200,
+            text="commitsha"
+        )
+
+        tree_api_url = "https://api.github.com/repos/testuser/testrepo/git/trees/commitsha?recursive=1"
+        mock.get(tree_api_url).respond(
+            status_code=200,
+            json={
+                "tree": [
+                    {
+                        "path": "main.py",
+                        "type": "blob",
+                        "url": "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1",
+                        "sha": "sha1"
+                    }
+                ]
+            }
+        )
+
+        blob_url = "https://api.github.com/repos/testuser/testrepo/git/blobs/sha1"
+        mock.get(blob_url).respond(
+            status_code=500
+        )
+
+        mistral_api_url = "https://api.mistral.ai/v1/chat/completions"
+        mistral_route = mock.post(mistral_api_url).respond(
+            status_code=200,
+            json={"choices": [{"message": {"content": "Review"}}]}
+        )
+
+        assert client.post("/review", json=data).status_code == 200
+        assert client.post("/review", json=data).status_code == 200
+        assert mistral_route.call_count == 2